@@ -1,6 +1,8 @@
+from string import digits
+
 from utils import (
+    AhoCorasick,
     concat_lists,
-    find_all_positions,
     get_lines,
     group_by,
     put_on_positions,
@@ -28,6 +30,13 @@ NUMBER_WORDS_SORTED = sorted(
 
 NUMBER_WORDS_GROUPED = group_by(NUMBER_WORDS, len)
 
+NUMBER_TOKENS = {
+    **{word: str(value) for word, value in NUMBER_WORDS.items()},
+    **{digit: digit for digit in digits},
+}
+
+NUMBER_MATCHER = AhoCorasick(NUMBER_TOKENS)
+
 
 # def replace_number_words(line):
 #     for length, items in sorted(
@@ -80,23 +89,19 @@ def calculate_calibration_value(line, filter_non_digits=True):
 
 def find_all_numbers(line):
     ds = {}
-    for word, value in NUMBER_WORDS.items():
-        positions = find_all_positions(line, word)
-        if positions:
-            ds[str(value)] = positions
-    for i, c in enumerate(line):
-        if c.isdigit():
-            if c in ds:
-                ds[c].append(i)
-            else:
-                ds[c] = [i]
+    for i, token in NUMBER_MATCHER.find_all(line):
+        value = NUMBER_TOKENS[token]
+        if value in ds:
+            ds[value].append(i)
+        else:
+            ds[value] = [i]
     return ds
 
 
 def calculate_calibration_value_with_number_words(line):
     numbers = find_all_numbers(line)
-    positions = concat_lists(numbers.values())
-    first, last = min(positions), max(positions)
+    first = min(concat_lists(numbers.values(), lazy=True))
+    last = max(concat_lists(numbers.values(), lazy=True))
     for what, where in numbers.items():
         if first in where:
             first = what
@@ -105,16 +110,16 @@ def calculate_calibration_value_with_number_words(line):
     return int(str(first) + str(last))
 
 
-def part_one():
+def part_one(use_mmap=False):
     total = 0
-    for line in get_lines("input/01.txt"):
+    for line in get_lines("input/01.txt", use_mmap=use_mmap):
         total += calculate_calibration_value(line)
     return total
 
 
-def part_two():
+def part_two(use_mmap=False):
     total = 0
-    for line in get_lines("input/01.txt"):
+    for line in get_lines("input/01.txt", use_mmap=use_mmap):
         total += calculate_calibration_value_with_number_words(line)
     return total
 
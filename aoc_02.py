@@ -90,16 +90,16 @@ def example_two():
     print(total)
 
 
-def part_one():
+def part_one(use_mmap=False):
     total = 0
-    for line in get_lines("input/02.txt"):
+    for line in get_lines("input/02.txt", use_mmap=use_mmap):
         if is_game_possible(line, REFERENCE_BAG):
             total += get_game_number(line)
     return total
 
-def part_two():
+def part_two(use_mmap=False):
     total = 0
-    for line in get_lines("input/02.txt"):
+    for line in get_lines("input/02.txt", use_mmap=use_mmap):
         cubes = get_fewest_number_of_cubes_possible(line)
         total += power_of_a_cubes_set(cubes)
     return total
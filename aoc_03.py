@@ -145,13 +145,13 @@ def example_two():
     assert total == 467835
 
 
-def part_one():
-    lines = list(get_lines("input/03.txt"))
+def part_one(use_mmap=False):
+    lines = list(get_lines("input/03.txt", use_mmap=use_mmap))
     return get_sum_of_part_numbers(lines)
 
 
-def part_two():
-    lines = list(get_lines("input/03.txt"))
+def part_two(use_mmap=False):
+    lines = list(get_lines("input/03.txt", use_mmap=use_mmap))
     return get_sum_of_all_gear_ratios(lines)
 
 
@@ -79,15 +79,15 @@ def example_two():
     print(count_all_scratchpad_copies(EXAMPLE_SCRATCHCARDS))
 
 
-def part_one():
+def part_one(use_mmap=False):
     total = 0
-    for line in get_lines("input/04.txt"):
+    for line in get_lines("input/04.txt", use_mmap=use_mmap):
         total += total_worth_of_scratchcards_on_card(line)
     return total
 
 
-def part_two():
-    return count_all_scratchpad_copies(get_lines("input/04.txt"))
+def part_two(use_mmap=False):
+    return count_all_scratchpad_copies(get_lines("input/04.txt", use_mmap=use_mmap))
 
 
 def main():
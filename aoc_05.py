@@ -1,9 +1,7 @@
 import re
 from collections import defaultdict
-from functools import reduce
-from operator import add
-
 from utils import (
+    concat_lists,
     get_lines,
 )
 
@@ -95,13 +93,13 @@ def parse_seed_line_part_one(line):
 
 def parse_seed_line_part_two(line):
     numbers = parse_seed_line_part_one(line)
-    numbers = sorted(reduce(add, [
-        list(range(
+    numbers = sorted(concat_lists(
+        range(
             numbers[i], numbers[i] + numbers[i+1]
-        ))
+        )
         for i
         in range(0, len(numbers), 2)
-    ], []))
+    ))
     return numbers
 
 
@@ -147,13 +145,13 @@ def example_two():
     print(find_location(EXAMPLE_ALMANAC, parse_seed_line_part_two))
 
 
-def part_one():
-    lines = "\n".join(get_lines("input/05.txt"))
+def part_one(use_mmap=False):
+    lines = "\n".join(get_lines("input/05.txt", use_mmap=use_mmap))
     return find_location(lines, parse_seed_line_part_one)
 
 
-def part_two():
-    lines = "\n".join(get_lines("input/05.txt"))
+def part_two(use_mmap=False):
+    lines = "\n".join(get_lines("input/05.txt", use_mmap=use_mmap))
     return find_location(lines, parse_seed_line_part_two)
 
 
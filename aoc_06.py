@@ -86,13 +86,16 @@ def example_two():
     print(result)
 
 
-def part_one():
-    result = get_result(get_lines("input/06.txt"))
+def part_one(use_mmap=False):
+    result = get_result(get_lines("input/06.txt", use_mmap=use_mmap))
     print(result)
 
 
-def part_two():
-    result = get_result(get_lines("input/06.txt"), ignore_spaces=True)
+def part_two(use_mmap=False):
+    result = get_result(
+        get_lines("input/06.txt", use_mmap=use_mmap),
+        ignore_spaces=True,
+    )
     print(result)
 
 
@@ -165,13 +165,13 @@ def example_two():
     print(get_total_winnings_2(EXAMPLE_INPUT.split("\n")))
 
 
-def part_one():
-    lines = get_lines("input/07.txt")
+def part_one(use_mmap=False):
+    lines = get_lines("input/07.txt", use_mmap=use_mmap)
     print(get_total_winnings(lines))
 
 
-def part_two():
-    lines = get_lines("input/07.txt")
+def part_two(use_mmap=False):
+    lines = get_lines("input/07.txt", use_mmap=use_mmap)
     print(get_total_winnings_2(lines))
 
 
@@ -100,8 +100,8 @@ def example_two():
     pass
 
 
-def part_one():
-    lines = get_lines("input/08.txt")
+def part_one(use_mmap=False):
+    lines = get_lines("input/08.txt", use_mmap=use_mmap)
     instructions, nodes = parse_input(lines)
     return move_through_nodes(instructions, nodes)
 
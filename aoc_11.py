@@ -1,12 +1,16 @@
 import heapq
+import math
 from collections import defaultdict, deque
 from dataclasses import dataclass
+from functools import partial
 from io import StringIO
 from itertools import combinations
+from multiprocessing import cpu_count
 
 import numpy as np
 
 from utils import (
+    compute_unordered,
     get_lines,
     get_lines_from_file,
 )
@@ -197,26 +201,57 @@ def display(grid):
         print()
 
 
-def get_sum_of_shortest_path_between_galaxies(it, strategy='bfs'):
+def get_shortest_path_length(grid, start, goal, strategy='bfs'):
+    args = grid, start, goal
+    if strategy == 'bfs':
+        return len(bfs_shortest_path(*args)) - 1
+    elif strategy == 'astar':
+        return len(a_star(*args))
+    elif strategy == 'dijkstra':
+        return len(dijkstra(*args))
+    else:
+        # unknown
+        return 0
+
+
+def get_sum_of_shortest_path_between_galaxies(
+    it,
+    strategy='bfs',
+    parallel=False,
+    chunksize=None,
+):
     expanded_galaxy = gravitational_expand(it)
     galaxy_positions = get_galaxy_positions(
         expanded_galaxy,
         wrapper=Point.from_tuple,
     )
 
-    s = 0
     combs = combinations(galaxy_positions, r=2)  # 91806
-    for p1, p2 in combs:
-        args = expanded_galaxy, p1.as_tuple(), p2.as_tuple()
-        if strategy == 'bfs':
-            result = len(bfs_shortest_path(*args)) - 1
-        elif strategy == 'astar':
-            result = len(a_star(*args))
-        elif strategy == 'dijkstra':
-            result = len(dijkstra(*args))
-        else:
-            # unknown
-            result = 0
+    pairs = (
+        (p1.as_tuple(), p2.as_tuple())
+        for p1, p2
+        in combs
+    )
+    shortest_path_length = partial(
+        get_shortest_path_length,
+        expanded_galaxy,
+        strategy=strategy,
+    )
+    if parallel:
+        if chunksize is None:
+            # the bound grid is pickled once per chunk, keep chunks few
+            n = len(galaxy_positions)
+            chunksize = max(1, math.ceil(n * (n - 1) // 2 / (4 * cpu_count())))
+        results = compute_unordered(
+            shortest_path_length,
+            pairs,
+            chunksize=chunksize,
+        )
+    else:
+        results = (shortest_path_length(*pair) for pair in pairs)
+
+    s = 0
+    for result in results:
         s += result
     return s
 
@@ -1,6 +1,13 @@
 import math
-from collections import defaultdict, deque
+import mmap
+import os
+import random
+import sys
+from array import array
+from collections import OrderedDict, defaultdict, deque, namedtuple
+from collections.abc import Mapping
 from enum import IntEnum, auto
+from itertools import compress, islice, repeat
 
 from points import Cell, Position
 
@@ -10,13 +17,416 @@ class GridType(IntEnum):
     RANDOM = auto()
 
 
+NONZERO_TABLE = bytes([0]) + bytes([1]) * 255
+
+
+def iter_byte_offsets(data, byte):
+    offset = data.find(byte)
+    while offset != -1:
+        yield offset
+        offset = data.find(byte, offset + 1)
+
+
+class StorageType(IntEnum):
+    LISTS = auto()
+    FLAT = auto()
+    CHUNKED = auto()
+
+
+class FlatStorage:
+    ENCODING = "latin-1"
+
+    def __init__(self, data, rows, cols):
+        assert len(data) == rows * cols, "Data does not match dimensions"
+        self.data = data
+        self.rows = rows
+        self.cols = cols
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = [
+            row if isinstance(row, str) else "".join(row)
+            for row
+            in rows
+        ]
+        n_rows = len(rows)
+        n_cols = len(rows[0]) if rows else 0
+        assert all(len(row) == n_cols for row in rows), "Rows are jagged"
+        data = bytearray("".join(rows), cls.ENCODING)
+        return cls(data, n_rows, n_cols)
+
+    @staticmethod
+    def _get_layout(buf, begin, end):
+        newline = buf.find(b"\n", begin, end)
+        if newline == -1:
+            return end - begin, b""
+        if newline > begin and buf[newline - 1] == ord("\r"):
+            return newline - 1 - begin, b"\r\n"
+        return newline - begin, b"\n"
+
+    @staticmethod
+    def _check_layout(buf, begin, end, cols, terminator):
+        stride = cols + len(terminator)
+        total = end - begin + len(terminator)
+        assert cols > 0 and total % stride == 0, "Rows are jagged"
+        rows = total // stride
+        for offset, byte in enumerate(terminator):
+            start = begin + cols + offset
+            expected = bytes([byte]) * (rows - 1)
+            assert buf[start:end:stride] == expected, "Rows are jagged"
+        return rows
+
+    @staticmethod
+    def _get_edges(buf):
+        begin, end = 0, len(buf)
+        while begin < end and buf[begin] in b"\r\n":
+            begin += 1
+        while end > begin and buf[end - 1] in b"\r\n":
+            end -= 1
+        return begin, end
+
+    @classmethod
+    def from_buffer(cls, buf, in_place=False):
+        begin, end = cls._get_edges(buf)
+        if begin == end:
+            return cls(bytearray(), 0, 0)
+        cols, terminator = cls._get_layout(buf, begin, end)
+        rows = cls._check_layout(buf, begin, end, cols, terminator)
+        stride = cols + len(terminator)
+        if in_place:
+            assert isinstance(buf, bytearray), "Only a bytearray can be reused"
+            data = buf
+        else:
+            data = bytearray(rows * cols)
+        # rows only ever move towards the front, so reusing buf is safe
+        for row in range(rows):
+            start = begin + row * stride
+            data[row * cols:(row + 1) * cols] = buf[start:start + cols]
+        del data[rows * cols:]
+        # a terminator left inside a row means the row lengths differ
+        assert b"\n" not in data and b"\r" not in data, "Rows are jagged"
+        return cls(data, rows, cols)
+
+    @classmethod
+    def from_file(cls, filename, use_mmap=False):
+        with open(filename, "rb") as f:
+            if not use_mmap:
+                data = bytearray(os.fstat(f.fileno()).st_size)
+                del data[f.readinto(data):]
+                return cls.from_buffer(data, in_place=True)
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files cannot be mapped
+                return cls(bytearray(), 0, 0)
+        with mm:
+            return cls.from_buffer(mm)
+
+    def is_inside(self, row, col):
+        return 0 <= row < self.rows and 0 <= col < self.cols
+
+    def index(self, row, col):
+        return row * self.cols + col
+
+    def position(self, idx):
+        return divmod(idx, self.cols)
+
+    def get(self, row, col):
+        if not self.is_inside(row, col):
+            return None
+        return chr(self.data[row * self.cols + col])
+
+    def set(self, row, col, value):
+        assert self.is_inside(row, col), "Index out of range"
+        self.data[row * self.cols + col] = ord(value)
+
+    def find(self, value, start=0):
+        idx = self.data.find(ord(value), start)
+        return None if idx == -1 else idx
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        if not 0 <= row < self.rows:
+            raise IndexError("Row out of range")
+        start = row * self.cols
+        return self.data[start:start + self.cols].decode(self.ENCODING)
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield self[row]
+
+
+class ChunkedStorage:
+    ENCODING = "latin-1"
+    TILE_SIZE = 64
+
+    def __init__(self, rows=0, cols=0, fill=".", tile_size=TILE_SIZE):
+        assert tile_size > 0
+        self.rows = rows
+        self.cols = cols
+        self.fill = fill
+        self.fill_byte = ord(fill)
+        self.tile_size = tile_size
+        self.tiles = {}
+
+    @classmethod
+    def from_rows(cls, rows, fill=".", tile_size=TILE_SIZE):
+        storage = cls(fill=fill, tile_size=tile_size)
+        for row, line in enumerate(rows):
+            if not isinstance(line, str):
+                line = "".join(line)
+            storage.put_row(row, line)
+            storage.rows = row + 1
+        return storage
+
+    @staticmethod
+    def _skip_blank_edges(lines):
+        # as in FlatStorage, blank lines before and after the map are dropped
+        blank = 0
+        started = False
+        for line in lines:
+            if not line:
+                blank += started
+                continue
+            for _ in range(blank):
+                yield ""
+            blank = 0
+            started = True
+            yield line
+
+    @classmethod
+    def from_file(cls, filename, fill=".", tile_size=TILE_SIZE):
+        with open(filename) as f:
+            return cls.from_rows(
+                cls._skip_blank_edges(line.rstrip("\r\n") for line in f),
+                fill=fill,
+                tile_size=tile_size,
+            )
+
+    def locate(self, row, col):
+        tile = self.tile_size
+        return (row // tile, col // tile), (row % tile) * tile + col % tile
+
+    def position(self, key, offset):
+        tile = self.tile_size
+        tile_row, tile_col = key
+        return tile_row * tile + offset // tile, tile_col * tile + offset % tile
+
+    def _get_tile(self, key):
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = bytearray([self.fill_byte]) * (self.tile_size ** 2)
+            self.tiles[key] = tile
+        return tile
+
+    def put_row(self, row, line):
+        tile = self.tile_size
+        fill = self.fill
+        for start in range(0, len(line), tile):
+            segment = line[start:start + tile]
+            if segment.count(fill) == len(segment):
+                continue
+            key, offset = self.locate(row, start)
+            self._get_tile(key)[offset:offset + len(segment)] = (
+                segment.encode(self.ENCODING)
+            )
+        self.cols = max(self.cols, len(line))
+
+    def is_inside(self, row, col):
+        return 0 <= row < self.rows and 0 <= col < self.cols
+
+    def get_byte(self, row, col):
+        key, offset = self.locate(row, col)
+        tile = self.tiles.get(key)
+        return self.fill_byte if tile is None else tile[offset]
+
+    def get(self, row, col):
+        if not self.is_inside(row, col):
+            return None
+        return chr(self.get_byte(row, col))
+
+    def set(self, row, col, value):
+        assert row >= 0 and col >= 0, "Index out of range"
+        key, offset = self.locate(row, col)
+        if key in self.tiles or value != self.fill:
+            self._get_tile(key)[offset] = ord(value)
+        self.rows = max(self.rows, row + 1)
+        self.cols = max(self.cols, col + 1)
+
+    def iter_cells(self):
+        tile = self.tile_size
+        for (tile_row, tile_col), data in sorted(self.tiles.items()):
+            for offset, byte in enumerate(data):
+                row = tile_row * tile + offset // tile
+                col = tile_col * tile + offset % tile
+                if self.is_inside(row, col):
+                    yield row, col, chr(byte)
+
+    def find_all(self, value):
+        assert value != self.fill, "Cannot search for the fill value"
+        byte = ord(value)
+        tile = self.tile_size
+        positions = []
+        for (tile_row, tile_col), data in self.tiles.items():
+            offset = data.find(byte)
+            while offset != -1:
+                positions.append((
+                    tile_row * tile + offset // tile,
+                    tile_col * tile + offset % tile,
+                ))
+                offset = data.find(byte, offset + 1)
+        return sorted(positions)
+
+    def find_position(self, value):
+        positions = self.find_all(value)
+        return positions[0] if positions else None
+
+    @property
+    def allocated_cells(self):
+        return len(self.tiles) * self.tile_size ** 2
+
+    def __len__(self):
+        return self.rows
+
+    def row_bytes(self, row, start, stop, tiles=None, fill=None):
+        # also reads per-tile results keyed like self.tiles, missing tiles
+        # read as fill
+        if tiles is None:
+            tiles, fill = self.tiles, self.fill_byte
+        tile = self.tile_size
+        tile_row, line = row // tile, (row % tile) * tile
+        parts = []
+        for tile_col in range(start // tile, (stop + tile - 1) // tile):
+            base = tile_col * tile
+            lo, hi = max(start - base, 0), min(stop - base, tile)
+            data = tiles.get((tile_row, tile_col))
+            parts.append(
+                bytes([fill]) * (hi - lo)
+                if data is None
+                else data[line + lo:line + hi]
+            )
+        return b"".join(parts)
+
+    def __getitem__(self, row):
+        if not 0 <= row < self.rows:
+            raise IndexError("Row out of range")
+        return self.row_bytes(row, 0, self.cols).decode(self.ENCODING)
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield self[row]
+
+    def to_bytes(self):
+        return "".join(self).encode(self.ENCODING)
+
+
+Loop = namedtuple("Loop", "cells farthest start_tile")
+Components = namedtuple("Components", "labels count sizes boxes")
+
+
+class PathTree(Mapping):
+    def __init__(self, parents, distances, cols):
+        self.parents = parents
+        self.distances = distances
+        self.cols = cols
+        self._size = len(distances) - distances.count(-1)
+
+    def _get_index(self, key):
+        row, col = key
+        idx = row * self.cols + col
+        if (
+            not 0 <= col < self.cols
+            or not 0 <= idx < len(self.distances)
+            or self.distances[idx] < 0
+        ):
+            raise KeyError(key)
+        return idx
+
+    def path_to(self, row, col):
+        idx = self._get_index((row, col))
+        path = []
+        while idx != -1:
+            path.append(divmod(idx, self.cols))
+            idx = self.parents[idx]
+        path.reverse()
+        return path
+
+    def steps_to(self, row, col):
+        return self.distances[self._get_index((row, col))]
+
+    def __getitem__(self, key):
+        return self.path_to(*key), self.steps_to(*key)
+
+    def __iter__(self):
+        cols = self.cols
+        for idx, distance in enumerate(self.distances):
+            if distance >= 0:
+                yield divmod(idx, cols)
+
+    def __len__(self):
+        return self._size
+
+
+class TiledPathTree(PathTree):
+    # per-tile results of a chunked grid, a parent is stored as the
+    # 1-based index of the step in directions that reached the cell
+    def __init__(self, parents, distances, storage, directions):
+        self.parents = parents
+        self.distances = distances
+        self.storage = storage
+        self.directions = directions
+        self._size = sum(
+            len(field) - field.count(-1)
+            for field
+            in distances.values()
+        )
+
+    def _get_index(self, key):
+        row, col = key
+        tile_key, offset = self.storage.locate(row, col)
+        field = self.distances.get(tile_key)
+        if row < 0 or col < 0 or field is None or field[offset] < 0:
+            raise KeyError(key)
+        return tile_key, offset
+
+    def path_to(self, row, col):
+        tile_key, offset = self._get_index((row, col))
+        path = [(row, col)]
+        move = self.parents[tile_key][offset]
+        while move:
+            dr, dc = self.directions[move - 1]
+            row, col = row - dr, col - dc
+            path.append((row, col))
+            tile_key, offset = self.storage.locate(row, col)
+            move = self.parents[tile_key][offset]
+        path.reverse()
+        return path
+
+    def steps_to(self, row, col):
+        tile_key, offset = self._get_index((row, col))
+        return self.distances[tile_key][offset]
+
+    def __iter__(self):
+        position = self.storage.position
+        for tile_key, field in sorted(self.distances.items()):
+            for offset, distance in enumerate(field):
+                if distance >= 0:
+                    yield position(tile_key, offset)
+
+
 class Grid:
     START_CELL = "S"
     EMPTY_CELL = " "
     OBSTACLE_CELL = "."
     SPECIAL_CELLS = set()
     GRID_SIZE = 5
+    CACHE_SIZE = 8
     CELL_WRAPPER = r"[{}]"
+    VISITED_WRAPPER = r"[{}]"
+    VISITED_MARK = "x"
+    UNVISITED_MARK = " "
     MASKS = [
         (-1, -1), (-1, 0), (-1, 1),
         (0, -1), (0, 1),
@@ -29,6 +439,15 @@ class Grid:
 
     DIRECTIONS = [UP, DOWN, LEFT, RIGHT]
 
+    # N/E/S/W connectivity bits, opposite directions are two bits apart
+    DIRECTION_BITS = {
+        UP: 1,
+        RIGHT: 2,
+        DOWN: 4,
+        LEFT: 8,
+    }
+    BIT_DIRECTIONS = {bit: direction for direction, bit in DIRECTION_BITS.items()}
+
     VALID_MOVES = {
         LEFT: {
             ("-", "-"),
@@ -108,9 +527,65 @@ class Grid:
 
         return grid, size, size
 
-    def _set_grid(self, which=GridType.EMPTY):
+    def _set_grid(self, which=GridType.EMPTY, **grid_options):
         if which == GridType.EMPTY:
             self.grid, self.rows, self.cols = self._get_empty_grid()
+            if self.storage == StorageType.FLAT:
+                self.grid = FlatStorage.from_rows(self.grid)
+            elif self.storage == StorageType.CHUNKED:
+                self.grid = ChunkedStorage(
+                    self.rows,
+                    self.cols,
+                    fill=self.get_empty_cell(),
+                )
+        elif which == GridType.RANDOM:
+            self.grid, self.rows, self.cols = self._get_random_grid(
+                **grid_options
+            )
+            if self.storage == StorageType.LISTS:
+                self.grid = [list(row) for row in self.grid]
+            elif self.storage == StorageType.CHUNKED:
+                self.grid = ChunkedStorage.from_rows(
+                    self.grid,
+                    fill=self.get_obstacle_cell(),
+                )
+
+    def _get_random_alphabet(
+        self,
+        with_empty_cells,
+        with_obstacle_cells,
+        with_special_cells,
+    ):
+        alphabet = []
+        if with_empty_cells:
+            alphabet.append(self.get_empty_cell())
+        if with_obstacle_cells:
+            alphabet.append(self.get_obstacle_cell())
+        if with_special_cells:
+            alphabet.extend(sorted(self.get_special_cells()))
+        return alphabet or [self.get_empty_cell()]
+
+    def _put_random_loop(self, storage, rng):
+        rows, cols = storage.rows, storage.cols
+        assert rows >= 2 and cols >= 2, "Grid is too small for a loop"
+        data = storage.data
+        top, bottom = sorted(rng.sample(range(rows), 2))
+        left, right = sorted(rng.sample(range(cols), 2))
+        width, height = right - left - 1, bottom - top - 1
+        start = top * cols + left
+        data[start:start + width + 2] = b"F" + b"-" * width + b"7"
+        start = bottom * cols + left
+        data[start:start + width + 2] = b"L" + b"-" * width + b"J"
+        for col in (left, right):
+            start = (top + 1) * cols + col
+            data[start:bottom * cols + col:cols] = b"|" * height
+        # nothing outside the loop may point into the start cell
+        obstacle = ord(self.get_obstacle_cell())
+        if top > 0:
+            data[(top - 1) * cols + left] = obstacle
+        if left > 0:
+            data[top * cols + left - 1] = obstacle
+        return top, left
 
     def _get_random_grid(
         self,
@@ -119,38 +594,119 @@ class Grid:
         with_obstacle_cells=False,
         with_special_cells=False,
         size=5,
+        seed=None,
+        with_loop=False,
     ):
-        pass
-
-    def __init__(self, grid=None):
+        rows, cols = (size, size) if isinstance(size, int) else size
+        rng = random.Random(seed)
+        alphabet = self._get_random_alphabet(
+            with_empty_cells,
+            with_obstacle_cells,
+            with_special_cells,
+        )
+        n = len(alphabet)
+        table = bytes(ord(alphabet[i % n]) for i in range(256))
+        # bytes past the last whole multiple of n are dropped and redrawn,
+        # otherwise the first 256 % n symbols would come up more often
+        rejected = bytes(range(256 - 256 % n, 256))
+        data = bytearray()
+        while len(data) < rows * cols:
+            chunk = rng.randbytes(rows * cols - len(data))
+            data += chunk.translate(table, rejected)
+        storage = FlatStorage(data, rows, cols)
+        start = None
+        if with_loop:
+            start = self._put_random_loop(storage, rng)
+        elif with_start_cell and rows * cols:
+            start = divmod(rng.randrange(rows * cols), cols)
+        if start is not None:
+            storage.set(*start, self.get_start_cell())
+        return storage, rows, cols
+
+    def __init__(
+        self,
+        grid=None,
+        storage=StorageType.LISTS,
+        which=GridType.EMPTY,
+        cache=False,
+        **grid_options,
+    ):
+        if isinstance(grid, FlatStorage):
+            storage = StorageType.FLAT
+        elif isinstance(grid, ChunkedStorage):
+            storage = StorageType.CHUNKED
+        self.storage = storage
+        # results are only kept when asked for, writes that bypass set_cell
+        # (e.g. grid.grid[row][col] = ...) would leave them stale
+        self.use_cache = cache
+        self._cache = OrderedDict()
+        self._passable = None
         if grid is None:
-            self._set_grid()
+            self._set_grid(which, **grid_options)
         else:
+            if storage == StorageType.FLAT and not isinstance(grid, FlatStorage):
+                grid = FlatStorage.from_rows(grid)
+            elif (
+                storage == StorageType.CHUNKED
+                and not isinstance(grid, ChunkedStorage)
+            ):
+                grid = ChunkedStorage.from_rows(
+                    grid,
+                    fill=self.get_obstacle_cell(),
+                )
             self.grid = grid
             self.rows = self._get_n_rows(grid)
             self.cols = self._get_n_cols(grid)
 
+    @classmethod
+    def random(cls, storage=StorageType.FLAT, **grid_options):
+        return cls(storage=storage, which=GridType.RANDOM, **grid_options)
+
+    @property
+    def is_flat(self):
+        return self.storage == StorageType.FLAT
+
+    @property
+    def is_chunked(self):
+        return self.storage == StorageType.CHUNKED
+
+    @classmethod
+    def load(cls, filename, use_mmap=False, cache=False):
+        return cls(FlatStorage.from_file(filename, use_mmap=use_mmap), cache=cache)
+
+    @classmethod
+    def load_sparse(
+        cls,
+        filename,
+        fill=None,
+        tile_size=ChunkedStorage.TILE_SIZE,
+        cache=False,
+    ):
+        if fill is None:
+            fill = cls.get_obstacle_cell()
+        return cls(ChunkedStorage.from_file(filename, fill, tile_size), cache=cache)
+
     def _get_n_rows(self, grid):
         return len(grid)
 
     def _get_n_cols(self, grid):
+        if isinstance(grid, (FlatStorage, ChunkedStorage)):
+            return grid.cols
         return len(grid[0])
 
     def is_valid_neighbour(self, origin, cell):
         return True
 
     def get_cell(self, row, col, strict=False):
-        # if strict:
-        #     assert 0 <= row < self.rows
-        #     assert 0 <= col < self.cols
-        # try:
-        #     return self.grid[row][col]
-        # except IndexError:
-        #     return None
-        try:
-            return self.grid[row][col]
-        except:
+        if strict:
+            assert self.is_inside_grid(row, col), "Index out of range"
+        if self.is_flat or self.is_chunked:
+            return self.grid.get(row, col)
+        if not self.is_inside_grid(row, col):
             return None
+        line = self.grid[row]
+        # list rows may be shorter than the first one
+        return line[col] if col < len(line) else None
 
     def check_cell(self, row, col, what, strict=False):
         return self.get_cell(row, col, strict) == what
@@ -159,11 +715,27 @@ class Grid:
         return self.check_cell(row, col, Grid.get_start_cell(), strict=strict)
 
     def _iterate_over_grid(self):
+        if self.is_flat:
+            cols = self.cols
+            for idx, sym in enumerate(self.grid.data):
+                yield [Cell(*divmod(idx, cols)), chr(sym)]
+            return
+        if self.is_chunked:
+            # only allocated tiles, the rest holds the fill value
+            for row, col, sym in self.grid.iter_cells():
+                yield [Cell(row, col), sym]
+            return
         for row in range(self.rows):
             for col in range(self.cols):
                 yield [Cell(row, col), self.get_cell(row, col)]
 
     def find_start_cell(self):
+        if self.is_flat:
+            idx = self.grid.find(self.get_start_cell())
+            return None if idx is None else Cell(*self.grid.position(idx))
+        if self.is_chunked:
+            position = self.grid.find_position(self.get_start_cell())
+            return None if position is None else Cell(*position)
         for cell, sym in self._iterate_over_grid():
             if sym == self.get_start_cell():
                 return cell
@@ -175,16 +747,109 @@ class Grid:
             in self.MASKS
         ]
 
+    def get_neighbour_offsets(self):
+        offsets = getattr(self, "_neighbour_offsets", None)
+        if offsets is None or offsets[0] != self.cols:
+            offsets = (
+                self.cols,
+                tuple(
+                    (dr, dc, dr * self.cols + dc)
+                    for dr, dc
+                    in self.MASKS
+                ),
+            )
+            self._neighbour_offsets = offsets
+        return offsets[1]
+
     def get_neighbours(self, r, c):
         origin = Cell(r, c)
-        positions = self._get_mask_positions()
         neighbour_cells = [
-            origin + pos
-            for pos
-            in positions
+            Cell(r + dr, c + dc)
+            for dr, dc, _
+            in self.get_neighbour_offsets()
         ]
         return origin, neighbour_cells
 
+    def neighbour_indices(self, idx):
+        rows, cols = self.rows, self.cols
+        row, col = divmod(idx, cols)
+        offsets = self.get_neighbour_offsets()
+        if 0 < row < rows - 1 and 0 < col < cols - 1:
+            return [idx + delta for _, _, delta in offsets]
+        return [
+            idx + delta
+            for dr, dc, delta
+            in offsets
+            if 0 <= row + dr < rows and 0 <= col + dc < cols
+        ]
+
+    def neighbours_of(self, indices):
+        rows, cols = self.rows, self.cols
+        offsets = self.get_neighbour_offsets()
+        table = [array("i") for _ in offsets]
+        for idx in indices:
+            row, col = divmod(idx, cols)
+            for column, (dr, dc, delta) in zip(table, offsets):
+                if 0 <= row + dr < rows and 0 <= col + dc < cols:
+                    column.append(idx + delta)
+                else:
+                    column.append(-1)
+        return table
+
+    def _get_neighbour_column(self, dr, dc, delta):
+        rows, cols = self.rows, self.cols
+        size = rows * cols
+        column = array("i", range(delta, size + delta))
+        missing = array("i", [-1])
+        edge = min(abs(dr), rows) * cols
+        if dr < 0:
+            column[:edge] = missing * edge
+        elif dr > 0:
+            column[size - edge:] = missing * edge
+        if dc < 0:
+            edge_cols = range(min(-dc, cols))
+        elif dc > 0:
+            edge_cols = range(max(cols - dc, 0), cols)
+        else:
+            edge_cols = ()
+        for col in edge_cols:
+            column[col::cols] = missing * rows
+        return column
+
+    def _get_tile_neighbour_columns(self, key):
+        cols = self.cols
+        positions = [
+            self.grid.position(key, offset)
+            for offset
+            in range(self.grid.tile_size ** 2)
+        ]
+        return [
+            array("q", [
+                (row + dr) * cols + col + dc
+                if self.is_inside_grid(row, col)
+                and self.is_inside_grid(row + dr, col + dc)
+                else -1
+                for row, col
+                in positions
+            ])
+            for dr, dc, _
+            in self.get_neighbour_offsets()
+        ]
+
+    def neighbour_table(self):
+        if self.is_chunked:
+            # only allocated tiles, "q" as row * cols can outgrow "i"
+            return {
+                key: self._get_tile_neighbour_columns(key)
+                for key
+                in self.grid.tiles
+            }
+        return [
+            self._get_neighbour_column(dr, dc, delta)
+            for dr, dc, delta
+            in self.get_neighbour_offsets()
+        ]
+
     def get_valid_neighbours(self, r, c):
         origin, neighbour_cells = self.get_neighbours(r, c)
         return [
@@ -215,45 +880,707 @@ class Grid:
             self.is_not_obstacle(row, col),
         ])
 
-    def dfs_grid(self, origin_cell):
-        visited = set()
+    def _iter_cells(self):
+        # row-major over rows * cols, past the end of a short row a cell
+        # reads as None, the same as get_cell
+        cols = self.cols
+        for row in self.grid:
+            yield from islice(row, cols)
+            yield from repeat(None, cols - len(row))
+
+    @staticmethod
+    def _get_byte_table(is_open):
+        return bytes(int(bool(is_open(chr(i)))) for i in range(256))
+
+    def _get_cell_mask(self, is_open):
+        assert not self.is_chunked, "Chunked grids have no dense buffer"
+        if self.is_flat:
+            return self.grid.data.translate(self._get_byte_table(is_open))
+        # list cells can be any string, so they are tested one by one
+        return bytearray(bool(is_open(cell)) for cell in self._iter_cells())
+
+    def _find_indices(self, value):
+        if self.is_flat:
+            yield from iter_byte_offsets(self.grid.data, ord(value))
+            return
+        for idx, cell in enumerate(self._iter_cells()):
+            if cell == value:
+                yield idx
+
+    def _get_passable(self):
+        # kept outside the LRU, every cache repair needs it
+        if self._passable is not None:
+            return self._passable
+        obstacle = self.get_obstacle_cell()
+        passable = self._get_cell_mask(lambda cell: cell != obstacle)
+        if self.use_cache:
+            self._passable = passable
+        return passable
+
+    def _get_cached(self, key):
+        if not self.use_cache:
+            return None
+        value = self._cache.get(key)
+        if value is not None:
+            self._cache.move_to_end(key)
+        return value
+
+    def _put_cached(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def _fill(self, passable, visited, stack):
+        cols = self.cols
+        size = self.rows * cols
+        push = stack.append
+        while stack:
+            idx = stack.pop()
+            col = idx % cols
+            nxt = idx - cols  # up
+            if nxt >= 0 and passable[nxt] and not visited[nxt]:
+                visited[nxt] = 1
+                push(nxt)
+            nxt = idx + cols  # down
+            if nxt < size and passable[nxt] and not visited[nxt]:
+                visited[nxt] = 1
+                push(nxt)
+            nxt = idx - 1  # left
+            if col > 0 and passable[nxt] and not visited[nxt]:
+                visited[nxt] = 1
+                push(nxt)
+            nxt = idx + 1  # right
+            if col < cols - 1 and passable[nxt] and not visited[nxt]:
+                visited[nxt] = 1
+                push(nxt)
+        return visited
 
-        def dfs(row, col):
-            if not self._is_valid_move(row, col) or (row, col) in visited:
-                return
-            visited.add((row, col))
+    def flood_fill(self, origin_cell):
+        if self.is_chunked:
+            return self._flood_fill_chunked(origin_cell)
+        row, col = origin_cell.as_tuple()
+        if not self.is_inside_grid(row, col):
+            return bytearray(self.rows * self.cols)
+        start = row * self.cols + col
+        key = ("reachable", start)
+        visited = self._get_cached(key)
+        if visited is None:
+            visited = bytearray(self.rows * self.cols)
+            passable = self._get_passable()
+            if passable[start]:
+                visited[start] = 1
+                self._fill(passable, visited, [start])
+            if not self.use_cache:
+                return visited
+            self._put_cached(key, visited)
+        # the cached mask is repaired in place on writes, hand out a copy
+        return visited[:]
+
+    def mask_to_positions(self, mask):
+        if isinstance(mask, dict):
+            position = self.grid.position
+            return {
+                position(key, offset)
+                for key, seen
+                in mask.items()
+                for offset
+                in compress(range(len(seen)), seen)
+            }
+        cols = self.cols
+        return {
+            divmod(idx, cols)
+            for idx
+            in compress(range(len(mask)), mask)
+        }
+
+    def _flood_fill_chunked(self, origin_cell):
+        storage = self.grid
+        obstacle = ord(self.get_obstacle_cell())
+        tile = storage.tile_size
+        visited = {}
+        row, col = origin_cell.as_tuple()
+        if (
+            not storage.is_inside(row, col)
+            or storage.get_byte(row, col) == obstacle
+        ):
+            return visited
+        stack = [(row, col)]
+        while stack:
+            row, col = stack.pop()
+            if not storage.is_inside(row, col):
+                continue
+            key = (row // tile, col // tile)
+            seen = visited.get(key)
+            if seen is None:
+                seen = visited[key] = bytearray(tile * tile)
+            offset = (row % tile) * tile + col % tile
+            if seen[offset] or storage.get_byte(row, col) == obstacle:
+                continue
+            seen[offset] = 1
+            stack.append((row - 1, col))  # up
+            stack.append((row + 1, col))  # down
+            stack.append((row, col - 1))  # left
+            stack.append((row, col + 1))  # right
+        return visited
 
-            dfs(row - 1, col)  # up
-            dfs(row + 1, col)  # down
-            dfs(row, col - 1)  # left
-            dfs(row, col + 1)  # right
+    def dfs_grid(self, origin_cell):
+        return self.mask_to_positions(self.flood_fill(origin_cell))
+
+    def _get_passable_mask(self, passable=None):
+        if passable is None:
+            return self._get_passable()
+        if isinstance(passable, (bytes, bytearray)):
+            assert len(passable) == self.rows * self.cols, "Mask size mismatch"
+            return passable.translate(NONZERO_TABLE)
+        if callable(passable):
+            return self._get_cell_mask(passable)
+        return self._get_cell_mask(set(passable).__contains__)
+
+    def _get_passable_table(self, passable=None):
+        # chunked grids are tested byte by byte through a lookup table
+        if passable is None:
+            obstacle = self.get_obstacle_cell()
+            return self._get_byte_table(lambda cell: cell != obstacle)
+        assert not isinstance(passable, (bytes, bytearray)), (
+            "Chunked grids take cell values or a predicate, not a mask"
+        )
+        if callable(passable):
+            return self._get_byte_table(passable)
+        return self._get_byte_table(set(passable).__contains__)
+
+    def _get_source_positions(self, origin):
+        if isinstance(origin, Cell) or (
+            isinstance(origin, tuple)
+            and len(origin) == 2
+            and all(isinstance(e, int) for e in origin)
+        ):
+            origin = [origin]
+        positions = []
+        for source in origin:
+            row, col = (
+                source.as_tuple()
+                if isinstance(source, Cell)
+                else source
+            )
+            if self.is_inside_grid(row, col):
+                positions.append((row, col))
+        return positions
+
+    def _get_source_indices(self, origin):
+        cols = self.cols
+        return [
+            row * cols + col
+            for row, col
+            in self._get_source_positions(origin)
+        ]
 
-        dfs(*origin_cell.as_tuple())
-        return visited
+    def _bfs_tree(self, sources, passable=None, with_parents=True):
+        cols = self.cols
+        size = self.rows * cols
+        if passable is None:
+            passable = self._get_passable()
+        distances = array("i", [-1]) * size
+        parents = array("i", [-1]) * size if with_parents else None
+        frontier = []
+        for idx in sources:
+            if passable[idx] and distances[idx] < 0:
+                distances[idx] = 0
+                frontier.append(idx)
+        step = 0
+        while frontier:
+            step += 1
+            next_frontier = []
+            push = next_frontier.append
+            for idx in frontier:
+                col = idx % cols
+                nxt = idx - cols  # up
+                if nxt >= 0 and passable[nxt] and distances[nxt] < 0:
+                    distances[nxt] = step
+                    if with_parents:
+                        parents[nxt] = idx
+                    push(nxt)
+                nxt = idx + cols  # down
+                if nxt < size and passable[nxt] and distances[nxt] < 0:
+                    distances[nxt] = step
+                    if with_parents:
+                        parents[nxt] = idx
+                    push(nxt)
+                nxt = idx - 1  # left
+                if col > 0 and passable[nxt] and distances[nxt] < 0:
+                    distances[nxt] = step
+                    if with_parents:
+                        parents[nxt] = idx
+                    push(nxt)
+                nxt = idx + 1  # right
+                if col < cols - 1 and passable[nxt] and distances[nxt] < 0:
+                    distances[nxt] = step
+                    if with_parents:
+                        parents[nxt] = idx
+                    push(nxt)
+            frontier = next_frontier
+        return distances, parents
+
+    def _bfs_tree_chunked(self, sources, table, with_parents=True):
+        # distances (and parents, see TiledPathTree) keyed by tile, a tile
+        # is only allocated once a passable cell in it is reached
+        storage = self.grid
+        tile = storage.tile_size
+        area = tile * tile
+        get_byte = storage.get_byte
+        distances = {}
+        parents = {} if with_parents else None
+        frontier = [(row, col, 0) for row, col in sources]
+        step = 0
+        while frontier:
+            next_frontier = []
+            push = next_frontier.append
+            for row, col, move in frontier:
+                if (
+                    not storage.is_inside(row, col)
+                    or not table[get_byte(row, col)]
+                ):
+                    continue
+                key = (row // tile, col // tile)
+                field = distances.get(key)
+                if field is None:
+                    field = distances[key] = array("i", [-1]) * area
+                    if with_parents:
+                        parents[key] = bytearray(area)
+                offset = (row % tile) * tile + col % tile
+                if field[offset] >= 0:
+                    continue
+                field[offset] = step
+                if with_parents:
+                    parents[key][offset] = move
+                for move, (dr, dc) in enumerate(self.DIRECTIONS, 1):
+                    push((row + dr, col + dc, move))
+            frontier = next_frontier
+            step += 1
+        return distances, parents
+
+    def _find_runs(self, passable, row):
+        cols = self.cols
+        offset = row * cols
+        stop = offset + cols
+        runs = []
+        start = passable.find(1, offset, stop)
+        while start != -1:
+            end = passable.find(0, start, stop)
+            if end == -1:
+                end = stop
+            runs.append((start - offset, end - offset))
+            start = passable.find(1, end, stop)
+        return runs
+
+    def label_components(self, passable=None):
+        if self.is_chunked:
+            return self._label_components_chunked(
+                self._get_passable_table(passable)
+            )
+        if passable is None:
+            components = self._get_cached(("components",))
+            if components is None:
+                components = self._label_components(self._get_passable())
+                if not self.use_cache:
+                    return components
+                self._put_cached(("components",), components)
+            return components._replace(
+                labels=components.labels[:],
+                sizes=components.sizes[:],
+                boxes=components.boxes[:],
+            )
+        return self._label_components(self._get_passable_mask(passable))
+
+    def _label_components(self, passable):
+        cols = self.cols
+        labels = array("i", [0]) * (self.rows * cols)
+
+        def put_run(row, start, end, number):
+            offset = row * cols
+            fill = array("i", [number]) * (end - start)
+            labels[offset + start:offset + end] = fill
+
+        return self._label_runs(
+            (
+                (row, self._find_runs(passable, row))
+                for row
+                in range(self.rows)
+            ),
+            labels,
+            put_run,
+        )
 
-    def dfs_paths(self, origin_cell):
-        paths = {}
+    def _find_runs_chunked(self, table, row, tile_cols):
+        storage = self.grid
+        tile = storage.tile_size
+        line = (row % tile) * tile
+        runs = []
+        for tile_col in tile_cols:
+            base = tile_col * tile
+            width = min(tile, self.cols - base)
+            data = storage.tiles.get((row // tile, tile_col))
+            segment = (
+                bytes([table[storage.fill_byte]]) * width
+                if data is None
+                else data[line:line + width].translate(table)
+            )
+            start = segment.find(1)
+            while start != -1:
+                end = segment.find(0, start)
+                if end == -1:
+                    end = width
+                if runs and runs[-1][1] == base + start:
+                    # run carried over from the tile on the left
+                    runs[-1] = (runs[-1][0], base + end)
+                else:
+                    runs.append((base + start, base + end))
+                start = segment.find(1, end)
+        return runs
+
+    def _label_components_chunked(self, table):
+        # labels keyed by tile, with an obstacle fill only the rows and
+        # tiles that were allocated are scanned
+        storage = self.grid
+        tile = storage.tile_size
+        area = tile * tile
+        all_tile_cols = range((self.cols + tile - 1) // tile)
+        by_tile_row = defaultdict(list)
+        if table[storage.fill_byte]:
+            for tile_row in range((self.rows + tile - 1) // tile):
+                by_tile_row[tile_row] = all_tile_cols
+        else:
+            for tile_row, tile_col in sorted(storage.tiles):
+                by_tile_row[tile_row].append(tile_col)
+        labels = {}
+
+        def row_runs():
+            for tile_row, tile_cols in sorted(by_tile_row.items()):
+                stop = min((tile_row + 1) * tile, self.rows)
+                for row in range(tile_row * tile, stop):
+                    yield row, self._find_runs_chunked(table, row, tile_cols)
+
+        def put_run(row, start, end, number):
+            line = (row % tile) * tile
+            while start < end:
+                tile_col, col = divmod(start, tile)
+                stop = min(end, start - col + tile)
+                key = (row // tile, tile_col)
+                field = labels.get(key)
+                if field is None:
+                    field = labels[key] = array("i", [0]) * area
+                field[line + col:line + col + stop - start] = (
+                    array("i", [number]) * (stop - start)
+                )
+                start = stop
+
+        return self._label_runs(row_runs(), labels, put_run)
+
+    def _label_runs(self, row_runs, labels, put_run):
+        parent = []
+
+        def find(label):
+            while parent[label] != label:
+                parent[label] = parent[parent[label]]
+                label = parent[label]
+            return label
+
+        # first pass: provisional label per run, union overlapping runs
+        all_runs = []
+        prev_runs = []
+        prev_row = None
+        for row, found in row_runs:
+            if prev_row != row - 1:
+                prev_runs = []
+            prev_row = row
+            runs = []
+            i = 0
+            for start, end in found:
+                label = len(parent)
+                parent.append(label)
+                while i < len(prev_runs) and prev_runs[i][1] <= start:
+                    i += 1
+                j = i
+                while j < len(prev_runs) and prev_runs[j][0] < end:
+                    a, b = find(prev_runs[j][2]), find(label)
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+                    j += 1
+                runs.append((start, end, label))
+                all_runs.append((row, start, end, label))
+            prev_runs = runs
+
+        # second pass: final labels in row-major order of first appearance
+        final = {}
+        sizes = []
+        boxes = []
+        for row, start, end, label in all_runs:
+            root = find(label)
+            if root not in final:
+                final[root] = len(final) + 1
+                sizes.append(0)
+                boxes.append([row, start, row, end - 1])
+            number = final[root]
+            put_run(row, start, end, number)
+            sizes[number - 1] += end - start
+            box = boxes[number - 1]
+            box[1] = min(box[1], start)
+            box[2] = row
+            box[3] = max(box[3], end - 1)
+        return Components(
+            labels=labels,
+            count=len(final),
+            sizes=sizes,
+            boxes=[tuple(box) for box in boxes],
+        )
 
-        def dfs(row, col, path):
-            if not self._is_valid_move(row, col) or (row, col) in set(path):
-                return
+    def distance_field(self, origin, passable=None):
+        if self.is_chunked:
+            distances, _ = self._bfs_tree_chunked(
+                self._get_source_positions(origin),
+                self._get_passable_table(passable),
+                with_parents=False,
+            )
+            return distances
+        sources = self._get_source_indices(origin)
+        key = ("distances", tuple(sorted(set(sources))))
+        if passable is not None:
+            distances, _ = self._bfs_tree(
+                sources,
+                self._get_passable_mask(passable),
+                with_parents=False,
+            )
+            return distances
+        distances = self._get_cached(key)
+        if distances is None:
+            distances, _ = self._bfs_tree(
+                sources,
+                self._get_passable(),
+                with_parents=False,
+            )
+            if not self.use_cache:
+                return distances
+            self._put_cached(key, distances)
+        # the cached field is repaired in place on writes, hand out a copy
+        return distances[:]
+
+    def _get_neighbours4(self, idx):
+        row, col = divmod(idx, self.cols)
+        return [
+            (row + dr) * self.cols + col + dc
+            for dr, dc
+            in self.DIRECTIONS
+            if self.is_inside_grid(row + dr, col + dc)
+        ]
 
-            new_path = path + [(row, col)]
+    def _repair_distances(self, distances, idx, passable):
+        reached = [
+            distances[nxt]
+            for nxt
+            in self._get_neighbours4(idx)
+            if distances[nxt] >= 0
+        ]
+        if not reached:
+            return
+        distances[idx] = min(reached) + 1
+        queue = deque([idx])
+        while queue:
+            current = queue.popleft()
+            step = distances[current] + 1
+            for nxt in self._get_neighbours4(current):
+                if passable[nxt] and not 0 <= distances[nxt] <= step:
+                    distances[nxt] = step
+                    queue.append(nxt)
+
+    def _update_cache(self, idx, old_value, new_value):
+        obstacle = self.get_obstacle_cell()
+        was_passable = old_value != obstacle
+        is_passable = new_value != obstacle
+        if was_passable == is_passable:
+            return
+        if self._passable is None:
+            # nothing was derived from the old passability yet
+            return
+        passable = self._passable
+        passable[idx] = int(is_passable)
+        neighbours = self._get_neighbours4(idx)
+        for key, value in list(self._cache.items()):
+            kind = key[0]
+            if kind == "components":
+                stale = True
+            elif kind == "reachable":
+                stale = key[1] == idx or (not is_passable and value[idx])
+                if not stale and is_passable:
+                    if any(value[nxt] for nxt in neighbours):
+                        value[idx] = 1
+                        self._fill(passable, value, [idx])
+            elif kind == "distances":
+                stale = idx in key[1] or (
+                    not is_passable and value[idx] >= 0
+                )
+                if not stale and is_passable:
+                    self._repair_distances(value, idx, passable)
+            elif kind == "paths":
+                distances = value.distances
+                stale = idx in key[1] or (
+                    distances[idx] >= 0
+                    if not is_passable
+                    else any(distances[nxt] >= 0 for nxt in neighbours)
+                )
+            else:
+                stale = True
+            if stale:
+                del self._cache[key]
+
+    def set_cell(self, row, col, value):
+        if self.is_chunked:
+            # chunked grids grow on writes past their current extent
+            self.grid.set(row, col, value)
+            self.rows, self.cols = self.grid.rows, self.grid.cols
+            self.clear_cache()
+            return
+        assert self.is_inside_grid(row, col), "Index out of range"
+        old_value = self.get_cell(row, col)
+        if self.is_flat:
+            self.grid.set(row, col, value)
+        elif isinstance(self.grid[row], str):
+            line = self.grid[row]
+            self.grid[row] = line[:col] + value + line[col + 1:]
+        else:
+            self.grid[row][col] = value
+        self._update_cache(row * self.cols + col, old_value, value)
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._passable = None
+
+    def farthest_cell(self, distances):
+        if isinstance(distances, dict):
+            # per-tile field, ties go to the first cell in row-major order
+            position, farthest = None, -1
+            for key, field in distances.items():
+                distance = max(field)
+                if distance < 0 or distance < farthest:
+                    continue
+                candidate = self.grid.position(key, field.index(distance))
+                if distance > farthest or candidate < position:
+                    position, farthest = candidate, distance
+            return position, farthest
+        farthest = max(distances, default=-1)
+        if farthest < 0:
+            return None, -1
+        return divmod(distances.index(farthest), self.cols), farthest
+
+    def count_reachable(self, distances):
+        if isinstance(distances, dict):
+            return sum(
+                len(field) - field.count(-1)
+                for field
+                in distances.values()
+            )
+        return len(distances) - distances.count(-1)
+
+    def _nearest_target_chunked(self, distances, target):
+        storage = self.grid
+        byte = ord(target)
+        best, best_distance = None, -1
+        for key, field in distances.items():
+            data = storage.tiles.get(key)
+            if data is not None:
+                offsets = iter_byte_offsets(data, byte)
+            elif byte == storage.fill_byte:
+                offsets = range(len(field))
+            else:
+                continue
+            for offset in offsets:
+                distance = field[offset]
+                if distance < 0:
+                    continue
+                position = storage.position(key, offset)
+                if best is None or (distance, position) < (best_distance, best):
+                    best, best_distance = position, distance
+        return best, best_distance
+
+    def nearest_target(self, distances, target):
+        if self.is_chunked:
+            return self._nearest_target_chunked(distances, target)
+        best, best_distance = None, -1
+        for idx in self._find_indices(target):
+            distance = distances[idx]
+            if distance >= 0 and (best is None or distance < best_distance):
+                best, best_distance = idx, distance
+        if best is None:
+            return None, -1
+        return divmod(best, self.cols), best_distance
 
-            paths[(row, col)] = (new_path, len(new_path) - 1)
+    def dfs_paths(self, origin_cell):
+        if self.is_chunked:
+            distances, parents = self._bfs_tree_chunked(
+                self._get_source_positions(origin_cell),
+                self._get_passable_table(),
+            )
+            return TiledPathTree(parents, distances, self.grid, self.DIRECTIONS)
+        row, col = origin_cell.as_tuple()
+        sources = (
+            [row * self.cols + col]
+            if self.is_inside_grid(row, col)
+            else []
+        )
+        key = ("paths", tuple(sources))
+        tree = self._get_cached(key)
+        if tree is None:
+            distances, parents = self._bfs_tree(sources)
+            tree = PathTree(parents, distances, self.cols)
+            if not self.use_cache:
+                return tree
+            self._put_cached(key, tree)
+        return PathTree(tree.parents[:], tree.distances[:], self.cols)
+
+    @staticmethod
+    def opposite_bit(bit):
+        return ((bit << 2) | (bit >> 2)) & 0b1111
 
-            dfs(row - 1, col, new_path)
-            dfs(row + 1, col, new_path)
-            dfs(row, col - 1, new_path)
-            dfs(row, col + 1, new_path)
+    @classmethod
+    def get_connectivity_table(cls):
+        table = cls.__dict__.get("_connectivity_table")
+        if table is None:
+            masks = bytearray(256)
+            for direction, moves in cls.VALID_MOVES.items():
+                bit = cls.DIRECTION_BITS[direction]
+                for current_value, next_value in moves:
+                    masks[ord(current_value)] |= bit
+                    masks[ord(next_value)] |= cls.opposite_bit(bit)
+            table = bytes(masks)
+            cls._connectivity_table = table
+        return table
 
-        dfs(*origin_cell.as_tuple(), [])
-        return paths
+    @classmethod
+    def get_connectivity(cls, value):
+        if not isinstance(value, str) or len(value) != 1 or ord(value) > 255:
+            return 0
+        return cls.get_connectivity_table()[ord(value)]
+
+    def connectivity_map(self):
+        if self.is_chunked:
+            # keyed by tile, tiles never allocated hold the fill's bits
+            table = self.get_connectivity_table()
+            return {
+                key: data.translate(table)
+                for key, data
+                in self.grid.tiles.items()
+            }
+        if self.is_flat:
+            return self.grid.data.translate(self.get_connectivity_table())
+        return bytearray(map(self.get_connectivity, self._iter_cells()))
 
     def _can_move(self, current_value, next_value, direction):
         if current_value == self.START_CELL:
             return True
-        return (current_value, next_value) in self.VALID_MOVES[direction]
+        bit = self.DIRECTION_BITS[direction]
+        return bool(
+            self.get_connectivity(current_value) & bit
+            and self.get_connectivity(next_value) & self.opposite_bit(bit)
+        )
 
     # def _can_move(self, current_value, next_value, direction):
     #     return (
@@ -367,33 +1694,100 @@ class Grid:
 
         return paths
 
-    def show_visited(self, visited):
-        for row in range(self.rows):
-            for col in range(self.cols):
-                if (row, col) in visited:
-                    print("[x]", end="")
-                else:
-                    print("[ ]", end="")
-            print()
-
-    def __str__(self):
-        flag = (
-            hasattr(self, "CELL_WRAPPER")
-            and isinstance(self.CELL_WRAPPER, str)
-            and r"{}" in self.CELL_WRAPPER
+    def _get_visited_tiles(self, visited):
+        # chunked grids mark visited cells per tile, like flood_fill
+        if isinstance(visited, dict):
+            return visited
+        storage = self.grid
+        area = storage.tile_size ** 2
+        tiles = {}
+        for row, col in visited:
+            if self.is_inside_grid(row, col):
+                key, offset = storage.locate(row, col)
+                seen = tiles.get(key)
+                if seen is None:
+                    seen = tiles[key] = bytearray(area)
+                seen[offset] = 1
+        return tiles
+
+    def _get_visited_mask(self, visited):
+        size = self.rows * self.cols
+        if isinstance(visited, (bytes, bytearray)) and len(visited) == size:
+            return visited
+        mask = bytearray(size)
+        cols = self.cols
+        for row, col in visited:
+            if self.is_inside_grid(row, col):
+                mask[row * cols + col] = 1
+        return mask
+
+    def _get_viewport(self, viewport):
+        if viewport is None:
+            return 0, self.rows, 0, self.cols
+        row_start, row_stop, col_start, col_stop = viewport
+        row_start, row_stop, _ = slice(row_start, row_stop).indices(self.rows)
+        col_start, col_stop, _ = slice(col_start, col_stop).indices(self.cols)
+        return row_start, row_stop, col_start, col_stop
+
+    @staticmethod
+    def _split_wrapper(wrapper):
+        if isinstance(wrapper, str) and r"{}" in wrapper:
+            prefix, suffix = wrapper.split(r"{}", 1)
+            return prefix, suffix, suffix + prefix
+        return "", "", ""
+
+    def render_rows(self, visited=None, viewport=None):
+        row_start, row_stop, col_start, col_stop = self._get_viewport(viewport)
+        if visited is None:
+            prefix, suffix, sep = self._split_wrapper(
+                getattr(self, "CELL_WRAPPER", None)
+            )
+            for row in range(row_start, row_stop):
+                line = self.grid[row][col_start:col_stop]
+                yield prefix + sep.join(line) + suffix if line else ""
+            return
+        prefix, suffix, sep = self._split_wrapper(self.VISITED_WRAPPER)
+        table = bytes(
+            ord(self.VISITED_MARK if i else self.UNVISITED_MARK)
+            for i
+            in range(256)
+        )
+        if self.is_chunked:
+            tiles = self._get_visited_tiles(visited)
+            segments = (
+                self.grid.row_bytes(row, col_start, col_stop, tiles, 0)
+                for row
+                in range(row_start, row_stop)
+            )
+        else:
+            mask = self._get_visited_mask(visited)
+            cols = self.cols
+            segments = (
+                mask[row * cols + col_start:row * cols + col_stop]
+                for row
+                in range(row_start, row_stop)
+            )
+        for segment in segments:
+            line = segment.translate(table).decode(FlatStorage.ENCODING)
+            yield prefix + sep.join(line) + suffix if line else ""
+
+    def render(self, visited=None, viewport=None):
+        return "\n".join(self.render_rows(visited, viewport))
+
+    def write_rendered(self, file=None, visited=None, viewport=None):
+        if file is None:
+            file = sys.stdout
+        file.writelines(
+            line + "\n"
+            for line
+            in self.render_rows(visited, viewport)
         )
 
-        s = ""
-        for row in range(self.rows):
-            for col in range(self.cols):
-                cell = self.grid[row][col]
-                if flag:
-                    s += self.CELL_WRAPPER.format(cell)
-                else:
-                    s += cell
+    def show_visited(self, visited, file=None, viewport=None):
+        self.write_rendered(file, visited=visited, viewport=viewport)
 
-            s += "\n"
-        return s.strip()
+    def __str__(self):
+        return self.render().strip()
 
 
 class CustomGrid(Grid):
@@ -402,7 +1796,108 @@ class CustomGrid(Grid):
 
     def is_valid_neighbour(self, origin, cell):
         cell = self.get_cell(*cell.as_tuple())
-        return cell in grid.SPECIAL_CELLS
+        return cell in self.SPECIAL_CELLS
+
+    def _get_start_tile_candidates(self, start_cell):
+        row, col = start_cell.as_tuple()
+        mask = 0
+        for direction, bit in self.DIRECTION_BITS.items():
+            dx, dy = direction
+            neighbour = self.get_cell(row + dx, col + dy)
+            if self.get_connectivity(neighbour) & self.opposite_bit(bit):
+                mask |= bit
+        # stray pipes may point at S too, so any pair of them is a candidate
+        table = self.get_connectivity_table()
+        return [
+            sym
+            for sym
+            in sorted(self.SPECIAL_CELLS)
+            if table[ord(sym)] & mask == table[ord(sym)]
+        ]
+
+    def _trace_from(self, start, start_tile):
+        mask = self.get_connectivity(start_tile)
+        bit = mask & -mask
+        closing_bit = self.opposite_bit(mask & ~bit)
+        row, col = start
+        cells = [start]
+        while True:
+            dx, dy = self.BIT_DIRECTIONS[bit]
+            row, col = row + dx, col + dy
+            if (row, col) == start:
+                if bit != closing_bit:
+                    raise ValueError(f"Loop does not close through {start_tile}")
+                break
+            came_from = self.opposite_bit(bit)
+            mask = self.get_connectivity(self.get_cell(row, col))
+            if not mask & came_from:
+                raise ValueError(f"Loop is broken at {(row, col)}")
+            bit = mask & ~came_from
+            cells.append((row, col))
+        return cells
+
+    def infer_start_tile(self, start_cell):
+        return self.trace_loop(start_cell).start_tile
+
+    def trace_loop(self, start_cell=None):
+        if start_cell is None:
+            start_cell = self.find_start_cell()
+        assert start_cell is not None, "Start cell not found"
+        start = start_cell.as_tuple()
+        for start_tile in self._get_start_tile_candidates(start_cell):
+            try:
+                cells = self._trace_from(start, start_tile)
+            except ValueError:
+                continue
+            return Loop(
+                cells=cells,
+                farthest=len(cells) // 2,
+                start_tile=start_tile,
+            )
+        raise ValueError(f"Cannot infer start tile at {start}")
+
+    def _enclosed_area_shoelace(self, loop):
+        cells = loop.cells
+        twice_area = 0
+        prev_row, prev_col = cells[-1]
+        for row, col in cells:
+            twice_area += prev_row * col - row * prev_col
+            prev_row, prev_col = row, col
+        # Pick's theorem: A = I + B / 2 - 1
+        return abs(twice_area) // 2 - len(cells) // 2 + 1
+
+    def _enclosed_area_scanline(self, loop):
+        start = loop.cells[0]
+        north = self.DIRECTION_BITS[self.UP]
+        by_row = defaultdict(list)
+        for row, col in loop.cells:
+            tile = (
+                loop.start_tile
+                if (row, col) == start
+                else self.get_cell(row, col)
+            )
+            by_row[row].append((col, bool(self.get_connectivity(tile) & north)))
+        total = 0
+        for crossings in by_row.values():
+            crossings.sort()
+            inside = False
+            prev_col = None
+            for col, is_north in crossings:
+                if inside:
+                    total += col - prev_col - 1
+                if is_north:
+                    inside = not inside
+                prev_col = col
+        return total
+
+    def enclosed_area(self, loop=None, strategy="shoelace"):
+        if loop is None:
+            loop = self.trace_loop()
+        if strategy == "shoelace":
+            return self._enclosed_area_shoelace(loop)
+        elif strategy == "scanline":
+            return self._enclosed_area_scanline(loop)
+        raise ValueError(f"Unknown strategy: {strategy}")
 
     @classmethod
     def _iterate_over_file(cls, filename):
@@ -432,68 +1927,143 @@ def euclidean_distance(point1, point2):
     return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
 
 
-# EXAMPLE_GRID = [
-#     [".", ".", "F", "7", "."],
-#     [".", "F", "J", "|", "."],
-#     ["S", "J", ".", "L", "7"],
-#     ["|", "F", "-", "-", "J"],
-#     ["L", "J", ".", ".", "."],
-# ]
-# grid = CustomGrid(EXAMPLE_GRID)
-_input = CustomGrid.from_file("input/10.txt")
-# print(_input[0])
-grid = CustomGrid(_input)
-# print(grid)
-# print("=" * 15)
-# print(grid.get_valid_neighbours(1, 1))
-# print(grid.find_start_cell())
-start_cell = grid.find_start_cell()
-# print(start_cell)
-# visited = grid.dfs_grid(start_cell)
-# print(visited)
-# print()
-# grid.show_visited(visited)
-# paths = grid.dfs_paths(start_cell)
-# print(paths)
-# for origin, (path, steps) in paths.items():
-#     grid.show_visited(path)
-#     print("Number of steps:", steps)
-
-# max_so_far = 0
-paths = grid.dfs_grid_with_comparison(start_cell)
-# print([
-#     grid.manhattan_distance(p[0][0], p[0][-1])
-#     for p
-#     in paths.values()
-# ])
-
-saved_paths = defaultdict(list)
-for origin, (path, steps) in paths.items():
-    # grid.show_visited(path)
-    beg, end = path[0], path[-1]
-    md = manhattan_distance(beg, end)
-    saved_paths[md].append((path, steps))
-    # if max_so_far < steps:
-        # max_so_far = steps
-    # print("Number of steps:", steps)
-# print(max_so_far)
-
-# paths = [p[0] for p in paths.values()]
-# path = max(paths, key=lambda p: manhattan_distance(p[0], p[-1]))
-# print(path)
-
-best_path = None
-max_ed = 0
-max_steps = 0
-for path, steps in saved_paths.get(max(saved_paths)):
-    # grid.show_visited(path)
-    ed = euclidean_distance(path[0], path[-1])
-    if ed > max_ed:
-        best_path = path
-        max_ed = ed
-        max_steps = steps
-    # print("Number of steps:", steps)
-
-grid.show_visited(best_path)
-print(max_steps)
-
+EXAMPLE_SQUARE_LOOP = [
+    "-L|F7",
+    "7S-7|",
+    "L|7||",
+    "-L-J|",
+    "L|-JF",
+]
+EXAMPLE_COMPLEX_LOOP = [
+    "7-F7-",
+    ".FJ|7",
+    "SJLL7",
+    "|F--J",
+    "LJ.LJ",
+]
+EXAMPLE_STRAY_PIPES = [
+    ".....",
+    ".F-7.",
+    "-S.|.",
+    ".L-J.",
+]
+EXAMPLE_ENCLOSED_SMALL = [
+    "...........",
+    ".S-------7.",
+    ".|F-----7|.",
+    ".||.....||.",
+    ".||.....||.",
+    ".|L-7.F-J|.",
+    ".|..|.|..|.",
+    ".L--J.L--J.",
+    "...........",
+]
+EXAMPLE_ENCLOSED_SQUEEZED = [
+    "..........",
+    ".S------7.",
+    ".|F----7|.",
+    ".||....||.",
+    ".||....||.",
+    ".|L-7F-J|.",
+    ".|..||..|.",
+    ".L--JL--J.",
+    "..........",
+]
+EXAMPLE_ENCLOSED_LARGE = [
+    ".F----7F7F7F7F-7....",
+    ".|F--7||||||||FJ....",
+    ".||.FJ||||||||L7....",
+    "FJL7L7LJLJ||LJ.L-7..",
+    "L--J.L7...LJS7F-7L7.",
+    "....F-J..F7FJ|L7L7L7",
+    "....L7.F7||L7|.L7L7|",
+    ".....|FJLJ|FJ|F7|.LJ",
+    "....FJL-7.||.||||...",
+    "....L---J.LJ.LJLJ...",
+]
+EXAMPLE_ENCLOSED_JUNK = [
+    "FF7FSF7F7F7F7F7F---7",
+    "L|LJ||||||||||||F--J",
+    "FL-7LJLJ||||||LJL-77",
+    "F--JF--7||LJLJ7F7FJ-",
+    "L---JF-JLJ.||-FJLJJ7",
+    "|F|F-JF---7F7-L7L|7|",
+    "|FFJF7L7F-JF7|JL---7",
+    "7-L-JL7||F7|L7F-7F7|",
+    "L.L7LFJ|||||FJL7||LJ",
+    "L7JLJL-JLJLJL--JLJ.L",
+]
+
+
+def example_one():
+    for example, farthest in (
+        (EXAMPLE_SQUARE_LOOP, 4),
+        (EXAMPLE_COMPLEX_LOOP, 8),
+        (EXAMPLE_STRAY_PIPES, 4),
+    ):
+        loop = CustomGrid(example).trace_loop()
+        assert loop.farthest == farthest
+
+
+def example_two():
+    for example, enclosed in (
+        (EXAMPLE_SQUARE_LOOP, 1),
+        (EXAMPLE_COMPLEX_LOOP, 1),
+        (EXAMPLE_STRAY_PIPES, 1),
+        (EXAMPLE_ENCLOSED_SMALL, 4),
+        (EXAMPLE_ENCLOSED_SQUEEZED, 4),
+        (EXAMPLE_ENCLOSED_LARGE, 8),
+        (EXAMPLE_ENCLOSED_JUNK, 10),
+    ):
+        grid = CustomGrid(example)
+        loop = grid.trace_loop()
+        assert grid.enclosed_area(loop) == enclosed
+        assert grid.enclosed_area(loop, strategy="scanline") == enclosed
+
+
+def main(filename="input/10.txt"):
+    # EXAMPLE_GRID = [
+    #     [".", ".", "F", "7", "."],
+    #     [".", "F", "J", "|", "."],
+    #     ["S", "J", ".", "L", "7"],
+    #     ["|", "F", "-", "-", "J"],
+    #     ["L", "J", ".", ".", "."],
+    # ]
+    # grid = CustomGrid(EXAMPLE_GRID)
+    example_one()
+    example_two()
+
+    grid = CustomGrid.load(filename)
+    # print(grid)
+    # print("=" * 15)
+    # print(grid.get_valid_neighbours(1, 1))
+    # print(grid.find_start_cell())
+    start_cell = grid.find_start_cell()
+    # print(start_cell)
+    # visited = grid.dfs_grid(start_cell)
+    # print(visited)
+    # print()
+    # grid.show_visited(visited)
+    # paths = grid.dfs_paths(start_cell)
+    # print(paths)
+    # for origin, (path, steps) in paths.items():
+    #     grid.show_visited(path)
+    #     print("Number of steps:", steps)
+
+    loop = grid.trace_loop(start_cell)
+    grid.show_visited(loop.cells)
+    print(loop.farthest)
+    print(grid.enclosed_area(loop))
+
+
+if __name__ == "__main__":
+    if "--check-import" in sys.argv[1:]:
+        from utils import check_import_time
+
+        self_us, cumulative_us, calls = check_import_time("grid")
+        print(
+            f"grid imported in {self_us}us ({cumulative_us}us with its imports)"
+            f" making {calls} calls"
+        )
+    else:
+        main(*sys.argv[1:2])
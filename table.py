@@ -0,0 +1,86 @@
+from itertools import chain
+
+import numpy as np
+
+from utils import ScanOutcome
+
+
+class NumericTable:
+    def __init__(self, data, outcome):
+        self.data = data
+        self.outcome = outcome
+
+    @classmethod
+    def from_rows(cls, numeric_nested_list, fill_value=0):
+        rows = list(numeric_nested_list)
+        lengths = np.fromiter(map(len, rows), dtype=np.intp, count=len(rows))
+        outcome = cls._scan_lengths(lengths)
+        if outcome == ScanOutcome.ROWS_1D_EMPTY:
+            return cls(np.empty((0, 0)), outcome)
+        if outcome == ScanOutcome.ROWS_EMPTY:
+            return cls(np.empty((len(rows), 0)), outcome)
+        if outcome == ScanOutcome.ROWS_EQUAL_LENGTH:
+            return cls(np.asarray(rows), outcome)
+        flat = np.asarray(list(chain.from_iterable(rows)))
+        mask = np.arange(lengths.max()) >= lengths[:, None]
+        padded = np.full(mask.shape, fill_value, dtype=flat.dtype)
+        padded[~mask] = flat
+        return cls(np.ma.masked_array(padded, mask=mask), outcome)
+
+    @staticmethod
+    def _scan_lengths(lengths):
+        if lengths.size == 0:
+            return ScanOutcome.ROWS_1D_EMPTY
+        if not lengths.any():
+            return ScanOutcome.ROWS_EMPTY
+        if (lengths == lengths[0]).all():
+            return ScanOutcome.ROWS_EQUAL_LENGTH
+        return ScanOutcome.ROWS_JAGGED
+
+    def scan_rows(self):
+        return self.outcome
+
+    @property
+    def is_jagged(self):
+        return self.outcome == ScanOutcome.ROWS_JAGGED
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def column(self, col_num):
+        assert col_num < self.data.shape[1], "Index out of range"
+        return self.data[:, col_num]
+
+    def sum_column(self, col_num):
+        if self.data.size == 0:
+            return 0
+        total = self.column(col_num).sum()
+        return 0 if total is np.ma.masked else total.item()
+
+    def sum_columns(self):
+        return self.data.sum(axis=0)
+
+    def transpose(self):
+        return self.data.T
+
+    def get_right_diagonal(self):
+        rows = self.data.shape[0]
+        assert rows <= self.data.shape[1], "Index out of range"
+        idx = np.arange(rows)
+        return self.data[idx, idx]
+
+    def get_left_diagonal(self):
+        rows = self.data.shape[0]
+        assert rows <= self.data.shape[1], "Index out of range"
+        idx = np.arange(rows)
+        return self.data[idx, rows - 1 - idx]
+
+    def to_lists(self):
+        if self.is_jagged:
+            return [
+                row.compressed().tolist()
+                for row
+                in self.data
+            ]
+        return self.data.tolist()
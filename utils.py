@@ -1,11 +1,13 @@
+import atexit
 import math
+import mmap
+import os
 import sys
-from collections import defaultdict
+from collections import defaultdict, deque
 from enum import IntEnum
-from functools import reduce
-from itertools import zip_longest
+from functools import partial
+from itertools import chain, compress, islice, zip_longest
 from multiprocessing import Pool, cpu_count
-from operator import add
 from typing import List, Union
 
 
@@ -23,7 +25,11 @@ def get_lines_from_file(file_obj):
                 yield line
 
 
-def get_lines(filename):
+def get_lines(filename, use_mmap=False):
+    if use_mmap:
+        for line in get_lines_mmap(filename):
+            yield line.decode()
+        return
     with open(filename) as f:
         for line in f:
             line = line.strip()
@@ -31,6 +37,39 @@ def get_lines(filename):
                 yield line
 
 
+def get_lines_mmap(filename, as_memoryview=False):
+    with open(filename, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            return
+    buf = memoryview(mm) if as_memoryview else None
+    cur = 0
+    try:
+        for line in iter(mm.readline, b""):
+            if not as_memoryview:
+                line = line.strip()
+                if line:
+                    yield line
+                continue
+            # strip in C, then turn the lengths back into offsets in the map
+            start, cur = cur, cur + len(line)
+            stripped = line.lstrip()
+            beg = start + len(line) - len(stripped)
+            stop = beg + len(stripped.rstrip())
+            if beg < stop:
+                yield buf[beg:stop]
+    finally:
+        try:
+            if as_memoryview:
+                buf.release()
+            mm.close()
+        except BufferError:
+            # caller still holds views into the map, leave it to the GC
+            pass
+
+
 def apply(e, *funcs):
     for func in funcs:
         e = func(e)
@@ -53,26 +92,111 @@ def identity(x):
     return x
 
 
+def compile_hooks(process):
+    if callable(process):
+        return process
+    funcs = tuple(func for func in process if func is not identity)
+    if not funcs:
+        return identity
+    if len(funcs) == 1:
+        return funcs[0]
+
+    def fused(e):
+        for func in funcs:
+            e = func(e)
+        return e
+    return fused
+
+
+def compile_block_hooks(process):
+    funcs = [process] if callable(process) else list(process)
+    hooks = [BLOCK_HOOKS.get(func) for func in funcs if func is not identity]
+    if not hooks or None in hooks:
+        return None
+    keeps_newline = all(keep for _, keep in hooks)
+    return compile_hooks([block for block, _ in hooks]), keeps_newline
+
+
+def _apply_block_hook(lines, block_hook, attached):
+    # runs the hook once over the whole block joined by newlines;
+    # `attached` tells whether the lines still carry their "\n"
+    process, keeps_newline = block_hook
+    ended = attached and lines[-1].endswith("\n")
+    text = "".join(lines) if attached else "\n".join(lines)
+    if ended:
+        text = text[:-1]
+    lines = process(text).split("\n")
+    attached = attached and keeps_newline
+    if attached:
+        lines = [line + "\n" for line in lines]
+        if not ended:
+            lines[-1] = lines[-1][:-1]
+    return lines, attached
+
+
+def _run_hooks_batched(
+    lines,
+    preprocess,
+    condition,
+    postprocess,
+    batch_size,
+    preprocess_block=None,
+    postprocess_block=None,
+):
+    while True:
+        block = list(islice(lines, batch_size))
+        if not block:
+            break
+        attached = True
+        if preprocess_block is not None:
+            block, attached = _apply_block_hook(block, preprocess_block, attached)
+        elif preprocess is not identity:
+            block = list(map(preprocess, block))
+            # an arbitrary hook may or may not have kept the newlines
+            attached = None
+        if condition is not None:
+            block = list(filter(condition, block))
+            if not block:
+                continue
+        if postprocess_block is not None and attached is not None:
+            block, _ = _apply_block_hook(block, postprocess_block, attached)
+        elif postprocess is not identity:
+            block = map(postprocess, block)
+        yield from block
+
+
 def get_lines_with_hooks(
     filename,
     preprocess=identity,
     condition=None,
     postprocess=identity,
+    batch_size=None,
 ):
-    def _f(line, process):
-        return (
-            process(line)
-            if callable(process)
-            else apply(line, *process)
-        )
+    if not callable(preprocess):
+        preprocess = tuple(preprocess)
+    if not callable(postprocess):
+        postprocess = tuple(postprocess)
+    preprocess_block = compile_block_hooks(preprocess)
+    postprocess_block = compile_block_hooks(postprocess)
+    preprocess = compile_hooks(preprocess)
+    postprocess = compile_hooks(postprocess)
     with open(filename) as f:
+        if batch_size is not None:
+            assert batch_size > 0
+            yield from _run_hooks_batched(
+                f,
+                preprocess,
+                condition,
+                postprocess,
+                batch_size,
+                preprocess_block,
+                postprocess_block,
+            )
+            return
         for line in f:
-            line = _f(line, preprocess)
-            if condition is not None:
-                if condition(line):
-                    yield _f(line, postprocess)
-            else:
-                yield _f(line, postprocess)
+            line = preprocess(line)
+            if condition is None or condition(line):
+                yield postprocess(line)
 
 
 def find_all_positions(where, what):
@@ -88,17 +212,128 @@ def find_all_positions(where, what):
     return positions
 
 
+class AhoCorasick:
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        assert all(self.patterns), "Empty patterns are not allowed"
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern in self.patterns:
+            self._insert(pattern)
+        self._link()
+
+    def _insert(self, pattern):
+        state = 0
+        for char in pattern:
+            nxt = self.goto[state].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][char] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = nxt
+        self.output[state].append(pattern)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                if self.fail[nxt] == nxt:
+                    self.fail[nxt] = 0
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def find_all(self, text):
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern in output[state]:
+                yield i - len(pattern) + 1, pattern
+
+
+class PositionalWriter:
+    FILLER = "x"
+
+    def __init__(self, size=0):
+        self.slots = []
+        self.touched = []
+        self.size = 0
+        self.reset(size)
+
+    def reset(self, size):
+        for position in self.touched:
+            self.slots[position].clear()
+        self.touched.clear()
+        missing = size + 1 - len(self.slots)
+        if missing > 0:
+            self.slots.extend([] for _ in range(missing))
+        self.size = size
+
+    def write(self, position, what):
+        assert 0 <= position <= self.size, "Index out of range"
+        slot = self.slots[position]
+        if not slot:
+            self.touched.append(position)
+        slot.append(str(what))
+
+    def write_all(self, positions):
+        for what, where in positions.items():
+            for who in where:
+                self.write(who, what)
+
+    def getvalue(self, strip=False):
+        parts = []
+        if strip:
+            for position in sorted(self.touched):
+                parts.extend(self.slots[position])
+        else:
+            filler = self.FILLER
+            for position in range(self.size):
+                parts.extend(self.slots[position])
+                parts.append(filler)
+            parts.extend(self.slots[self.size])
+        return "".join(parts)
+
+
 def put_on_positions(line, positions, strip=False):
-    s = "x" * len(line)
-    for what, where in positions.items():
-        for who in where:
-            s = s[:who] + str(what) + s[who:]
-    return s if not strip else s.replace("x", "")
+    writer = PositionalWriter(len(line))
+    writer.write_all(positions)
+    return writer.getvalue(strip)
+
+
+def put_on_positions_many(items, strip=False):
+    writer = PositionalWriter()
+    for line, positions in items:
+        writer.reset(len(line))
+        writer.write_all(positions)
+        yield writer.getvalue(strip)
 
 
-def sliding_window_non_overlap(s, n=1):
+BYTES_LIKE = (bytes, bytearray, memoryview, mmap.mmap)
+# str has no buffer to view, but its slices are still cheaper than tuples
+SLICEABLE = BYTES_LIKE + (str,)
+
+
+def _as_view(s, as_view):
+    if as_view and isinstance(s, BYTES_LIKE):
+        return memoryview(s)
+    return s
+
+
+def sliding_window_non_overlap(s, n=1, as_view=False):
     assert s
     assert 0 < n <= len(s)
+    s = _as_view(s, as_view)
     cur = 0
     while True:
         part = s[cur:cur+n]
@@ -109,9 +344,10 @@ def sliding_window_non_overlap(s, n=1):
             break
 
 
-def sliding_window_overlap(s, n=2):
+def sliding_window_overlap(s, n=2, as_view=False):
     assert s
     assert 0 < n <= len(s)
+    s = _as_view(s, as_view)
     cur = 0
     while True:
         part = s[cur:cur+n]
@@ -122,6 +358,39 @@ def sliding_window_overlap(s, n=2):
             break
 
 
+def windows(iterable, n=2, as_view=False):
+    assert n > 0
+    if as_view and isinstance(iterable, SLICEABLE):
+        if len(iterable) >= n:
+            yield from sliding_window_overlap(iterable, n, as_view=True)
+        return
+    it = iter(iterable)
+    window = deque(islice(it, n), maxlen=n)
+    if len(window) < n:
+        return
+    yield tuple(window)
+    for e in it:
+        window.append(e)
+        yield tuple(window)
+
+
+def chunks(iterable, n=1, as_view=False):
+    assert n > 0
+    if as_view and isinstance(iterable, SLICEABLE):
+        if iterable:
+            # a short input still comes back as one (partial) chunk
+            size = min(n, len(iterable))
+            yield from sliding_window_non_overlap(iterable, size, as_view=True)
+        return
+    it = iter(iterable)
+    while True:
+        chunk = tuple(islice(it, n))
+        if chunk:
+            yield chunk
+        else:
+            break
+
+
 def group_by(items, key_fn):
     assert callable(key_fn)
     dd = defaultdict(list)
@@ -130,8 +399,9 @@ def group_by(items, key_fn):
     return dd
 
 
-def concat_lists(lists):
-    return reduce(add, lists, [])
+def concat_lists(lists, lazy=False):
+    flat = chain.from_iterable(lists)
+    return flat if lazy else list(flat)
 
 
 def get_chars(obj, only_char=False):
@@ -173,17 +443,17 @@ def scan_rows(numeric_nested_list: List[List[Union[int, float]]]) -> ScanOutcome
         return ScanOutcome.ROWS_EMPTY
 
 
-def sum_column_naive(numeric_nested_list):
+def sum_column_naive(numeric_nested_list, col_num):
     total = 0
     for row in numeric_nested_list:
         try:
             total += row[col_num]
-        except:
+        except IndexError:
             continue
     return total
 
 
-def sum_column_inline(numeric_nested_list):
+def sum_column_inline(numeric_nested_list, col_num):
     return sum(a_list[col_num] for a_list in numeric_nested_list)
 
 
@@ -193,9 +463,9 @@ def sum_column(numeric_nested_list, col_num):
         return 0
     elif scan_outcome == ScanOutcome.ROWS_EQUAL_LENGTH:
         assert col_num < len(numeric_nested_list[0]), "Index out of range"
-        return sum_column_inline(numeric_nested_list)
+        return sum_column_inline(numeric_nested_list, col_num)
     else:
-        return sum_column_naive(numeric_nested_list)
+        return sum_column_naive(numeric_nested_list, col_num)
 
 
 def get_elements_for_mask(seq, masks):
@@ -210,11 +480,8 @@ def get_elements_for_mask(seq, masks):
 def chunks_iterative(seq, part_size):
     size = len(seq)
     assert 0 < part_size <= size
-    yield from [
-        seq[i:i+part_size]
-        for i
-        in range(size - part_size + 1)
-    ]
+    for i in range(size - part_size + 1):
+        yield seq[i:i+part_size]
 
 
 def chunks_step_by_step(seq, part_size):
@@ -249,13 +516,15 @@ def transpose(numeric_nested_list):
 
 
 def traverse_nested(data):
-    stack = data
-    while len(stack) > 0:
-        e = stack.pop()
-        if isinstance(e, list):
-            stack.extend(e)
-        else:
+    stack = [iter(data)]
+    while stack:
+        for e in stack[-1]:
+            if isinstance(e, list):
+                stack.append(iter(e))
+                break
             yield e
+        else:
+            stack.pop()
 
 
 def take_while(seq, predicate):
@@ -282,18 +551,335 @@ def without_digits(string):
     return "".join(c for c in string if not c.isdigit())
 
 
+_digit_table = None
+
+
+def _get_digit_table():
+    global _digit_table
+    if _digit_table is None:
+        _digit_table = dict.fromkeys(
+            i for i in range(sys.maxunicode + 1) if chr(i).isdigit()
+        )
+    return _digit_table
+
+
+def strip_block(text):
+    return "\n".join(map(str.strip, text.split("\n")))
+
+
+def only_digits_block(text):
+    digit_table = _get_digit_table()
+    return text.translate(dict.fromkeys(
+        i for i in map(ord, set(text))
+        if i not in digit_table and i != 10
+    ))
+
+
+def without_digits_block(text):
+    return text.translate(_get_digit_table())
+
+
+# hook -> (its form over "\n"-joined lines, whether the hook keeps "\n")
+BLOCK_HOOKS = {
+    str.strip: (strip_block, False),
+    only_digits: (only_digits_block, False),
+    without_digits: (without_digits_block, True),
+}
+
+
+SIEVE_LIMIT = 1 << 24
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+# smallest strong pseudoprime to all of MILLER_RABIN_BASES
+MILLER_RABIN_LIMIT = 318665857834031151167461
+
+_sieve = bytearray()
+
+
+def _build_sieve(limit):
+    sieve = bytearray([1]) * (limit + 1)
+    sieve[:2] = b"\x00\x00"[:limit + 1]
+    for i in range(2, math.isqrt(limit) + 1):
+        if sieve[i]:
+            sieve[i*i::i] = bytes(len(range(i*i, limit + 1, i)))
+    return sieve
+
+
+def _ensure_sieve(n):
+    global _sieve
+    if n >= len(_sieve):
+        limit = min(max(n, 2 * len(_sieve), 1 << 10), SIEVE_LIMIT - 1)
+        _sieve = _build_sieve(limit)
+    return _sieve
+
+
+def _passes_miller_rabin(n, bases):
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    for a in bases:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _jacobi(a, n):
+    a %= n
+    result = 1
+    while a:
+        while a % 2 == 0:
+            a //= 2
+            if n % 8 in (3, 5):
+                result = -result
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a %= n
+    return result if n == 1 else 0
+
+
+def _passes_strong_lucas(n):
+    if math.isqrt(n) ** 2 == n:
+        return False
+    # Selfridge's parameters: first D in 5, -7, 9, -11, ... with (D/n) = -1
+    D = 5
+    while True:
+        jacobi = _jacobi(D, n)
+        if jacobi == -1:
+            break
+        if jacobi == 0:
+            return abs(D) == n
+        D = -D - 2 if D > 0 else -D + 2
+    P, Q = 1, (1 - D) // 4
+    d, s = n + 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    U, V, Qk = 0, 2, 1
+    for bit in bin(d)[2:]:
+        U, V = U * V % n, (V * V - 2 * Qk) % n
+        Qk = Qk * Qk % n
+        if bit == "1":
+            U, V = P * U + V, D * U + P * V
+            if U % 2:
+                U += n
+            if V % 2:
+                V += n
+            U, V = U // 2 % n, V // 2 % n
+            Qk = Qk * Q % n
+    if U == 0 or V == 0:
+        return True
+    for _ in range(s - 1):
+        V = (V * V - 2 * Qk) % n
+        Qk = Qk * Qk % n
+        if V == 0:
+            return True
+    return False
+
+
+def _has_small_factor(n):
+    return any(n % p == 0 for p in MILLER_RABIN_BASES)
+
+
+def is_prime_miller_rabin(n):
+    assert n < MILLER_RABIN_LIMIT, "Bases are only deterministic below MILLER_RABIN_LIMIT"
+    if n < 2:
+        return False
+    if _has_small_factor(n):
+        return n in MILLER_RABIN_BASES
+    return _passes_miller_rabin(n, MILLER_RABIN_BASES)
+
+
+def is_prime_bpsw(n):
+    # Baillie-PSW: no counterexample is known, but none is proven impossible
+    if n < 2:
+        return False
+    if _has_small_factor(n):
+        return n in MILLER_RABIN_BASES
+    return _passes_miller_rabin(n, (2,)) and _passes_strong_lucas(n)
+
+
 def is_prime(n):
     if n <= 1:
         return False
-    for i in range(2, int(math.sqrt(n)) + 1):
-        if n % i == 0:
-            return False
-    return True
+    if n < SIEVE_LIMIT:
+        return bool(_ensure_sieve(n)[n])
+    if n < MILLER_RABIN_LIMIT:
+        return is_prime_miller_rabin(n)
+    return is_prime_bpsw(n)
+
+
+def is_prime_many(numbers):
+    numbers = list(numbers)
+    small = [n for n in numbers if 1 < n < SIEVE_LIMIT]
+    if small:
+        _ensure_sieve(max(small))
+    return [is_prime(n) for n in numbers]
+
+
+def primes_up_to(limit):
+    if limit < 2:
+        return []
+    sieve = (
+        _ensure_sieve(limit)
+        if limit < SIEVE_LIMIT
+        else _build_sieve(limit)
+    )
+    return list(compress(range(limit + 1), sieve[:limit + 1]))
+
+
+_pool = None
+
+
+def get_pool(processes=None):
+    global _pool
+    if _pool is None:
+        _pool = Pool(processes=processes or cpu_count())
+        atexit.register(shutdown_pool)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        atexit.unregister(shutdown_pool)
+        _pool.close()
+        _pool.join()
+        _pool = None
+
+
+def _star_call(computation, args):
+    return computation(*args)
+
+
+def compute(computation, *args, chunksize=None):
+    return get_pool().starmap(computation, *args, chunksize=chunksize)
+
+
+def compute_unordered(computation, iterable, chunksize=1):
+    yield from get_pool().imap_unordered(
+        partial(_star_call, computation),
+        iterable,
+        chunksize=chunksize,
+    )
+
+
+def _parse_import_time(stderr, module_name):
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module_name:
+            self_us = int(parts[0].split(":")[1])
+            return self_us, int(parts[1])
+    raise AssertionError(f"No import timing for {module_name}")
+
+
+def _run_import(args, module_name):
+    import subprocess
+
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    cmd = [sys.executable, *args]
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        cmd,
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+        env=env,
+    )
+    assert result.returncode == 0, result.stderr
+    return result
+
+
+def measure_import_time(module_name, runs=5):
+    args = ["-X", "importtime", "-c", f"import {module_name}"]
+    # first run only warms up the bytecode cache
+    _run_import(args, module_name)
+    best = None
+    for _ in range(runs):
+        result = _run_import(args, module_name)
+        timing = _parse_import_time(result.stderr, module_name)
+        # the fastest run is the one least disturbed by the rest of the box
+        best = timing if best is None else min(best, timing)
+    self_us, cumulative_us = best
+    return self_us, cumulative_us, result.stdout
+
+
+IMPORT_PROBE = """
+import sys
+from importlib.util import find_spec
+
+origin = find_spec({module!r}).origin
+calls = 0
+opened = []
+
 
+def count(frame, event, arg):
+    global calls
+    if event == "c_call":
+        calls += frame.f_code.co_filename == origin
+    elif event == "call" and frame.f_back is not None:
+        calls += frame.f_back.f_code.co_filename == origin
 
-def compute(computation, *args):
-    with Pool(processes=cpu_count()) as pool:
-        return pool.starmap(computation, *args)
+
+def audit(event, args):
+    if event == "open" and isinstance(args[0], str):
+        path = args[0]
+        if not path.endswith((".py", ".pyc")) and "__pycache__" not in path:
+            opened.append(path)
+
+
+sys.addaudithook(audit)
+sys.setprofile(count)
+import {module}
+sys.setprofile(None)
+print("import-probe", calls, *opened, sep="\\n", file=sys.stderr)
+"""
+
+
+def measure_import_work(module_name):
+    # calls made by the module's own code while it is imported, plus any
+    # file it opens that is not a module source
+    probe = IMPORT_PROBE.format(module=module_name)
+    result = _run_import(["-c", probe], module_name)
+    lines = result.stderr.splitlines()
+    marker = len(lines) - 1 - lines[::-1].index("import-probe")
+    calls, *opened = lines[marker + 1:]
+    return int(calls), opened, result.stdout
+
+
+def check_import_time(
+    module_name,
+    budget_us=5000,
+    call_budget=200,
+    cumulative_budget_us=None,
+):
+    # the call count and file opens are exact and carry the check; wall
+    # clock on a shared box swings too much for a sub-millisecond bound, so
+    # budget_us only backs it up against gross regressions
+    calls, opened, output = measure_import_work(module_name)
+    assert not output, f"Importing {module_name} writes to stdout"
+    assert not opened, f"Importing {module_name} opens {opened}"
+    assert calls <= call_budget, (
+        f"Importing {module_name} makes {calls} calls, budget is {call_budget}"
+    )
+    self_us, cumulative_us, _ = measure_import_time(module_name)
+    assert self_us <= budget_us, (
+        f"Importing {module_name} took {self_us}us, budget is {budget_us}us"
+    )
+    if cumulative_budget_us is not None:
+        assert cumulative_us <= cumulative_budget_us, (
+            f"Importing {module_name} with its imports took {cumulative_us}us,"
+            f" budget is {cumulative_budget_us}us"
+        )
+    return self_us, cumulative_us, calls
 
 
 """
@@ -311,4 +897,6 @@ for line in get_lines_with_hooks(
 def fn(a, b):
     return f"{a} & {b}"
 print(compute(fn, [("a", "b"), ("c", "d")]))
+print(sorted(compute_unordered(fn, [("a", "b"), ("c", "d")])))
+shutdown_pool()
 """
\ No newline at end of file